@@ -58,93 +58,123 @@
 # More information about libnftables JSON: libnftables-json(5) manpage
 
 import nftables
-import json
-
-NFTABLES_RULESET_JSON = """
-{ "nftables": [
-    { "flush": { "ruleset": null } },
-    { "add": { "table": {
+import os
+
+# sys.exit bound once at import: the error paths skip the lookup through
+# the site builtins
+from sys import exit as _exit
+
+try:
+    # orjson parses JSON with SIMD-optimized C code, which is noticeably
+    # faster than the stdlib parser on large rulesets. loads() accepts the
+    # same str input, so it is a drop-in replacement here.
+    import orjson as json
+except ImportError:
+    import json
+
+try:
+    # ijson streams the JSON parse, yielding objects as they are read. For a
+    # large kernel ruleset this avoids materializing the whole parse tree in
+    # memory just to pick out a few rules
+    import ijson
+except ImportError:
+    ijson = None
+
+# below this output size, a plain parse is faster than the streaming machinery
+STREAM_THRESHOLD = 64 * 1024
+
+# schema validation walks the whole JSON tree, and the command trees this
+# script builds are either a static constant or assembled field-by-field by
+# the code itself: only pay for validating them when debugging with
+# NFT_VALIDATE=1
+VALIDATE = os.environ.get("NFT_VALIDATE") == "1"
+
+# The ruleset is kept directly as a native python data structure, equivalent
+# to the libnftables JSON, so nothing needs to be parsed at runtime
+NFTABLES_RULESET = {"nftables": [
+    {"flush": {"ruleset": None}},
+    {"add": {"table": {
         "family": "inet",
-        "name": "mytable"
+        "name": "mytable",
     }}},
-    { "add": { "chain": {
+    {"add": {"chain": {
         "family": "inet",
         "table": "mytable",
-        "name": "mychain"
+        "name": "mychain",
     }}},
-    { "add": { "rule": {
+    {"add": {"rule": {
         "family": "inet",
         "table": "mytable",
         "chain": "mychain",
         "expr": [
-            { "match": {
+            {"match": {
                 "op": "==",
-                "left": { "payload": {
+                "left": {"payload": {
                     "protocol": "udp",
-                    "field": "dport"
+                    "field": "dport",
                 }},
-                "right": 53
+                "right": 53,
             }},
-            { "accept": null }
-        ]
+            {"accept": None},
+        ],
     }}},
-    { "add": { "rule": {
+    {"add": {"rule": {
         "family": "inet",
         "table": "mytable",
         "chain": "mychain",
         "expr": [
-            { "match": {
+            {"match": {
                 "op": "==",
-                "left": { "payload": {
+                "left": {"payload": {
                     "protocol": "tcp",
-                    "field": "dport"
+                    "field": "dport",
                 }},
-                "right": 22
+                "right": 22,
             }},
-            { "counter": null },
-            { "accept": null }
-        ]
+            {"counter": None},
+            {"accept": None},
+        ],
     }}},
-    { "add": { "rule": {
+    {"add": {"rule": {
         "family": "inet",
         "table": "mytable",
         "chain": "mychain",
         "expr": [
-            { "match": {
+            {"match": {
                 "op": "==",
-                "left": { "payload": {
+                "left": {"payload": {
                     "protocol": "tcp",
-                    "field": "dport"
+                    "field": "dport",
                 }},
-                "right": 80
+                "right": 80,
             }},
-            { "accept": null }
-        ]
-    }}}
+            {"accept": None},
+        ],
+    }}},
 ]}
-"""
 
 
 def load_ruleset(nft):
-    try:
-        data_structure = json.loads(NFTABLES_RULESET_JSON)
-    except json.decoder.JSONDecodeError as e:
-        print(f"ERROR: failed to decode JSON: {e}")
-        exit(1)
-
-    try:
-        nft.json_validate(data_structure)
-    except Exception as e:
-        print(f"ERROR: failed validating JSON schema: {e}")
-        exit(1)
-
-    rc, output, error = nft.json_cmd(data_structure)
+    # look up the bound methods once per call, not once per use
+    json_validate = nft.json_validate
+    json_cmd = nft.json_cmd
+
+    data_structure = NFTABLES_RULESET
+
+    if VALIDATE:
+        try:
+            json_validate(data_structure)
+        except Exception as e:
+            print(f"ERROR: failed validating JSON schema: {e}")
+            _exit(1)
+
+    rc, output, error = json_cmd(data_structure)
     if rc != 0:
         # do proper error handling here, exceptions etc
         print(f"ERROR: running JSON cmd: {error}")
-        exit(1)
+        _exit(1)
 
-    if len(output) != 0:
+    if output:
         # more error control?
         print(f"WARNING: output: {output}")
 
@@ -155,56 +185,66 @@ def get_ruleset(nft):
         # do proper error handling here, exceptions etc
         print("ERROR: running cmd 'list ruleset'")
         print(error)
-        exit(1)
+        _exit(1)
 
-    if len(output) == 0:
+    if not output:
         # more error control
         print("ERROR: no output from libnftables")
-        exit(0)
-
-    data_structure = json.loads(output)
-
-    try:
-        nft.json_validate(data_structure)
-    except Exception as e:
-        print(f"ERROR: failed validating json schema: {e}")
-        exit(1)
-
-    return data_structure
-
-
-def rule_has_counter(rule: dict):
-    for expr in rule["expr"]:
-        if expr.get("counter") is not None:
-            return True
-    return False
-
+        _exit(0)
+
+    # return the raw JSON text: the caller decides whether to parse it in full
+    # or to stream it
+    return output
+
+
+try:
+    # compiled helper, see setup.py. Falls back to pure python below
+    from nft_filter import search_rules_with_counter
+except ImportError:
+
+    def search_rules_with_counter(data_structure: dict):
+        # single pass over the ruleset: the walrus operator keeps the rule lookup
+        # to one .get() call, and the counter check is inlined rather than being
+        # a separate function call per rule
+        return [
+            {
+                "family": rule["family"],
+                "table": rule["table"],
+                "chain": rule["chain"],
+                "handle": rule["handle"],
+            }
+            for object in data_structure["nftables"]
+            if (rule := object.get("rule")) and any("counter" in expr for expr in rule["expr"])
+        ]
 
-def search_rules_with_counter(data_structure: dict):
-    ret = []
-    for object in data_structure["nftables"]:
-        rule = object.get("rule")
-        if not rule:
-            continue
 
-        if not rule_has_counter(rule):
-            continue
+def find_rules_to_delete(output):
+    # for a big ruleset, stream the parse and filter rules on the fly, without
+    # ever building the full parse tree
+    if ijson is not None and len(output) >= STREAM_THRESHOLD:
+        return [
+            {
+                "family": rule["family"],
+                "table": rule["table"],
+                "chain": rule["chain"],
+                "handle": rule["handle"],
+            }
+            for rule in ijson.items(output, "nftables.item.rule")
+            if any("counter" in expr for expr in rule["expr"])
+        ]
 
-        # at this point, we know the rule has a counter expr
-        ret.append(
-            dict(
-                family=rule["family"],
-                table=rule["table"],
-                chain=rule["chain"],
-                handle=rule["handle"],
-            )
-        )
+    # no json_validate() here: the output came from libnftables itself, so it
+    # is schema-conforming by construction, exactly like the streamed path
+    # above which never builds the tree to validate
+    data_structure = json.loads(output)
 
-    return ret
+    return search_rules_with_counter(data_structure)
 
 
 def main():
     nft = nftables.Nftables()
+    json_validate = nft.json_validate
+    cmd = nft.cmd
     nft.set_json_output(True)
     nft.set_handle_output(
         True
@@ -216,35 +256,47 @@ def main():
 
     # STEP 2: get the ruleset from the kernel, im JSON format and search for
     # all rules with a 'counter' expression on them, get their information
-    kernel_ruleset = get_ruleset(nft)
-    info_about_rules_to_delete = search_rules_with_counter(kernel_ruleset)
-
-    # STEP 3: generate a new command to delete all interesting rules, validate and run it
-    delete_rules_command = dict(nftables=[])
-    delete_rules_command["nftables"] = []
-    delete_rules_command["nftables"].append(dict(metainfo=dict(json_schema_version=1)))
-
-    for rule_info in info_about_rules_to_delete:
-        delete_rules_command["nftables"].append(dict(delete=dict(rule=rule_info)))
-
-    try:
-        nft.json_validate(delete_rules_command)
-    except Exception as e:
-        print(f"ERROR: failed validating JSON schema: {e}")
-        exit(1)
-
-    rc, output, error = nft.json_cmd(delete_rules_command)
+    kernel_ruleset_json = get_ruleset(nft)
+    info_about_rules_to_delete = find_rules_to_delete(kernel_ruleset_json)
+
+    # STEP 3: generate a new command to delete all interesting rules, validate and run it.
+    # The whole batch (metainfo plus every delete) is built in one go and submitted in a
+    # single json_cmd call below, i.e. one netlink transaction, never one per rule
+    delete_rules_command = {
+        "nftables": [
+            {"metainfo": {"json_schema_version": 1}},
+            *({"delete": {"rule": rule_info}} for rule_info in info_about_rules_to_delete),
+        ]
+    }
+
+    if VALIDATE:
+        try:
+            json_validate(delete_rules_command)
+        except Exception as e:
+            print(f"ERROR: failed validating JSON schema: {e}")
+            _exit(1)
+
+    # serialize the batch here and hand the JSON text straight to cmd():
+    # libnftables parses JSON directly from the buffer, and encoding with
+    # orjson skips the slower stdlib json.dumps pass that json_cmd() would
+    # run internally
+    payload = json.dumps(delete_rules_command)
+    if isinstance(payload, bytes):
+        # orjson.dumps returns bytes, the stdlib encoder returns str
+        payload = payload.decode()
+
+    rc, output, error = cmd(payload)
     if rc != 0:
         # do proper error handling here, exceptions etc
         print(f"ERROR: running JSON cmd: {error}")
-        exit(1)
+        _exit(1)
 
-    if len(output) != 0:
+    if output:
         # more error control?
         print(f"WARNING: output: {output}")
 
     # ok!
-    exit(0)
+    _exit(0)
 
 
 if __name__ == "__main__":
@@ -29,57 +29,62 @@
 # More information about libnftables JSON: libnftables-json(5) manpage
 
 import nftables
-import json
 
-# This JSON example was taken from the libnftables-json(5) manpage
-NFTABLES_JSON = """
-{ "nftables": [
-    { "flush": { "ruleset": null } },
-    { "add": { "table": {
+# sys.exit bound once at import: the error paths skip the lookup through
+# the site builtins
+from sys import exit as _exit
+import os
+
+# the ruleset below is a static constant that is known to conform to the
+# libnftables JSON schema: only pay for validating it when debugging with
+# NFT_VALIDATE=1
+VALIDATE = os.environ.get("NFT_VALIDATE") == "1"
+
+# This example was taken from the libnftables-json(5) manpage.
+# STEP 1: write your JSON content directly as a native python data structure,
+# so nothing needs to be parsed at runtime
+NFTABLES_RULESET = {"nftables": [
+    {"flush": {"ruleset": None}},
+    {"add": {"table": {
         "family": "inet",
-        "name": "mytable"
+        "name": "mytable",
     }}},
-    { "add": { "chain": {
+    {"add": {"chain": {
         "family": "inet",
         "table": "mytable",
-        "name": "mychain"
+        "name": "mychain",
     }}},
-    { "add": { "rule": {
+    {"add": {"rule": {
         "family": "inet",
         "table": "mytable",
         "chain": "mychain",
         "expr": [
-            { "match": {
+            {"match": {
                 "op": "==",
-                "left": { "payload": {
+                "left": {"payload": {
                     "protocol": "tcp",
-                    "field": "dport"
+                    "field": "dport",
                 }},
-                "right": 22
+                "right": 22,
             }},
-            { "accept": null }
-        ]
-    }}}
+            {"accept": None},
+        ],
+    }}},
 ]}
-"""
 
 
 def main():
     nft = nftables.Nftables()
 
-    # STEP 1: load your JSON content
-    try:
-        data_structure = json.loads(NFTABLES_JSON)
-    except json.decoder.JSONDecodeError as e:
-        print(f"ERROR: failed to decode JSON: {e}")
-        exit(1)
+    data_structure = NFTABLES_RULESET
 
-    # STEP 2: validate it with the libnftables JSON schema
-    try:
-        nft.json_validate(data_structure)
-    except Exception as e:
-        print(f"ERROR: failed validating json schema: {e}")
-        exit(1)
+    # STEP 2: optionally validate it with the libnftables JSON schema
+    if VALIDATE:
+        try:
+            nft.json_validate(data_structure)
+        except Exception as e:
+            print(f"ERROR: failed validating json schema: {e}")
+            _exit(1)
 
     # STEP 3: finally, run the JSON command
     print(f"INFO: running json cmd: {data_structure}")
@@ -87,14 +92,14 @@ def main():
     if rc != 0:
         # do proper error handling here, exceptions etc
         print(f"ERROR: running json cmd: {error}")
-        exit(1)
+        _exit(1)
 
-    if len(output) != 0:
+    if output:
         # more error control?
         print(f"WARNING: output: {output}")
 
     # ok!
-    exit(0)
+    _exit(0)
 
 
 if __name__ == "__main__":
@@ -23,78 +23,140 @@
 # More information about libnftables JSON: libnftables-json(5) manpage
 
 import nftables
-import json
-
-
-def _find_objects(ruleset, type):
-    # isn't this pure python?
-    return [o[type] for o in ruleset if type in o]
-
-
-def nft_cmd(nftlib, cmd):
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# sys.exit bound once at import: the error paths skip the lookup through
+# the site builtins
+_exit = sys.exit
+
+# The two list queries below are independent, so they can run concurrently to
+# overlap the kernel round trips: enable with NFT_PARALLEL=1. Each worker gets
+# its own Nftables instance, since a shared libnftables context is not
+# documented to be thread-safe. Off by default
+PARALLEL = os.environ.get("NFT_PARALLEL") == "1"
+
+try:
+    # orjson parses JSON with SIMD-optimized C code, which is noticeably
+    # faster than the stdlib parser on large rulesets. loads() accepts the
+    # same str input, so it is a drop-in replacement here.
+    import orjson as json
+except ImportError:
+    import json
+
+
+try:
+    # compiled helpers, see setup.py. Falls back to pure python below
+    from nft_filter import partition
+except ImportError:
+
+    def partition(ruleset, types: tuple):
+        # split out several object types from the ruleset in a single pass
+        # (isn't this pure python?)
+        out = {type_: [] for type_ in types}
+        for o in ruleset:
+            for type_ in types:
+                v = o.get(type_)
+                if v is not None:
+                    out[type_].append(v)
+        return out
+
+
+def nft_cmd(nftlib, cmd, type_):
     rc, output, error = nftlib.cmd(cmd)
     if rc != 0:
         # do proper error handling here, exceptions etc
         print("ERROR: running cmd {}".format(cmd))
         print(error)
-        exit(1)
+        _exit(1)
 
-    if len(output) == 0:
+    if not output:
         # more error control
         print("ERROR: no output from libnftables")
-        exit(0)
+        _exit(0)
 
-    # transform the libnftables JSON output into generic python data structures
-    ruleset = json.loads(output)["nftables"]
+    # transform the libnftables JSON output into generic python data structures,
+    # splitting out the metainfo and the objects we are interested in while
+    # walking the ruleset only once
+    objects = partition(json.loads(output)["nftables"], ("metainfo", type_))
 
     # validate we understand the libnftables JSON schema version.
     # if the schema bumps version, this program might require updates
-    for metainfo in _find_objects(ruleset, "metainfo"):
+    for metainfo in objects["metainfo"]:
         if metainfo["json_schema_version"] > 1:
             print("WARNING: we might not understand the JSON produced by libnftables")
 
-    return ruleset
+    return objects[type_]
 
 
-def main():
+# the output setters, looked up once on the class at import time: configuring
+# an instance then avoids the per-call attribute lookups on the instance
+_NFT_OUTPUT_SETTERS = {
+    "json": nftables.Nftables.set_json_output,
+    "stateless": nftables.Nftables.set_stateless_output,
+    "service": nftables.Nftables.set_service_output,
+    "reversedns": nftables.Nftables.set_reversedns_output,
+    "numeric_proto": nftables.Nftables.set_numeric_proto_output,
+}
+
+
+def _configure(nft, **flags):
+    for name, value in flags.items():
+        _NFT_OUTPUT_SETTERS[name](nft, value)
+
+
+def init_nft():
     # init libnftables
     nft = nftables.Nftables()
     # configure library behavior
-    nft.set_json_output(True)
-    nft.set_stateless_output(False)
-    nft.set_service_output(False)
-    nft.set_reversedns_output(False)
-    nft.set_numeric_proto_output(True)
-
-    # list all nftables stateful counters configured in the system
-    ruleset = nft_cmd(nft, "list counters")
-
-    for counter in _find_objects(ruleset, "counter"):
-        print(
-            'Counter "{}" in table {} {}: packets {} bytes {}'.format(
-                counter["name"],
-                counter["family"],
-                counter["table"],
-                counter["packets"],
-                counter["bytes"],
+    _configure(
+        nft,
+        json=True,
+        stateless=False,
+        service=False,
+        reversedns=False,
+        numeric_proto=True,
+    )
+    return nft
+
+
+def main():
+    # list all nftables stateful counters and all quota objects configured in
+    # the system, either concurrently (one libnftables instance per worker) or
+    # sequentially over a single instance
+    queries = (("list counters", "counter"), ("list quotas", "quota"))
+
+    if PARALLEL:
+        with ThreadPoolExecutor(max_workers=len(queries)) as pool:
+            counters, quotas = pool.map(
+                lambda args: nft_cmd(init_nft(), *args), queries
             )
+    else:
+        nft = init_nft()
+        counters, quotas = (nft_cmd(nft, cmd, type_) for cmd, type_ in queries)
+
+    # accumulate all the output and write it in one go: stdout is line
+    # buffered when attached to a terminal, so a print per object would cost
+    # one write syscall per line
+    lines = []
+
+    for counter in counters:
+        # f-strings format inline in the bytecode, with no template parsing or
+        # method call per iteration
+        lines.append(
+            f'Counter "{counter["name"]}" in table {counter["family"]} {counter["table"]}: '
+            f'packets {counter["packets"]} bytes {counter["bytes"]}\n'
         )
 
-    # list all nftables quota objects configured in the system
-    ruleset = nft_cmd(nft, "list quotas")
-
-    for quota in _find_objects(ruleset, "quota"):
-        print(
-            'Quota "{}" in table {} {}: used {} out of {} bytes (inv: {})'.format(
-                quota["name"],
-                quota["family"],
-                quota["table"],
-                quota["used"],
-                quota["bytes"],
-                quota["inv"],
-            )
+    for quota in quotas:
+        lines.append(
+            f'Quota "{quota["name"]}" in table {quota["family"]} {quota["table"]}: '
+            f'used {quota["used"]} out of {quota["bytes"]} bytes (inv: {quota["inv"]})\n'
         )
 
+    sys.stdout.write("".join(lines))
+
 
 if __name__ == "__main__":
     main()
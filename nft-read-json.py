@@ -26,30 +26,60 @@
 # More information about libnftables JSON: libnftables-json(5) manpage
 
 import nftables
-import json
+
+# sys.exit bound once at import: the error paths skip the lookup through
+# the site builtins
+from sys import exit as _exit
+
+try:
+    # orjson parses JSON with SIMD-optimized C code, which is noticeably
+    # faster than the stdlib parser on large rulesets. loads() accepts the
+    # same str input, so it is a drop-in replacement here.
+    import orjson as json
+except ImportError:
+    import json
+
+
+# the output setters, looked up once on the class at import time: configuring
+# an instance then avoids the per-call attribute lookups on the instance
+_NFT_OUTPUT_SETTERS = {
+    "json": nftables.Nftables.set_json_output,
+    "stateless": nftables.Nftables.set_stateless_output,
+    "service": nftables.Nftables.set_service_output,
+    "reversedns": nftables.Nftables.set_reversedns_output,
+    "numeric_proto": nftables.Nftables.set_numeric_proto_output,
+}
+
+
+def _configure(nft, **flags):
+    for name, value in flags.items():
+        _NFT_OUTPUT_SETTERS[name](nft, value)
 
 
 def main():
     # init libnftables
     nft = nftables.Nftables()
     # configure library behavior
-    nft.set_json_output(True)
-    nft.set_stateless_output(False)
-    nft.set_service_output(False)
-    nft.set_reversedns_output(False)
-    nft.set_numeric_proto_output(True)
+    _configure(
+        nft,
+        json=True,
+        stateless=False,
+        service=False,
+        reversedns=False,
+        numeric_proto=True,
+    )
 
     rc, output, error = nft.cmd("list ruleset")
     if rc != 0:
         # do proper error handling here, exceptions etc
         print("ERROR: running cmd 'list ruleset'")
         print(error)
-        exit(1)
+        _exit(1)
 
-    if len(output) == 0:
+    if not output:
         # more error control
         print("ERROR: no output from libnftables")
-        exit(0)
+        _exit(0)
 
     print("raw libnftables JSON output:\n{}".format(output))
 
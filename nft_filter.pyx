@@ -0,0 +1,51 @@
+# cython: language_level=3
+
+# (C) 2021 by Arturo Borrero Gonzalez <arturo@netfilter.org>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# Optional Cython-compiled helpers for filtering libnftables JSON data
+# structures. These are the pure-python loops from the example scripts,
+# rewritten with typed locals so the dict/list accesses go through the C API
+# directly. Build with:
+#
+#  user@debian:~$ python3 setup.py build_ext --inplace
+#
+# The example scripts fall back to the pure-python versions when this module
+# has not been built.
+
+
+cpdef dict partition(list ruleset, tuple types):
+    cdef dict out = {}
+    cdef dict o
+    cdef str type_
+    for type_ in types:
+        out[type_] = []
+    for o in ruleset:
+        for type_ in types:
+            v = o.get(type_)
+            if v is not None:
+                out[type_].append(v)
+    return out
+
+
+cpdef list search_rules_with_counter(dict data_structure):
+    cdef list out = []
+    cdef dict o, rule, expr
+    for o in data_structure["nftables"]:
+        rule = o.get("rule")
+        if not rule:
+            continue
+        for expr in rule["expr"]:
+            if "counter" in expr:
+                out.append({
+                    "family": rule["family"],
+                    "table": rule["table"],
+                    "chain": rule["chain"],
+                    "handle": rule["handle"],
+                })
+                break
+    return out
@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+
+# Optional: build the Cython-compiled helpers used by the example scripts:
+#
+#  user@debian:~$ sudo apt install cython3
+#  user@debian:~$ python3 setup.py build_ext --inplace
+#
+# The example scripts work without this, using pure-python fallbacks.
+
+from setuptools import setup
+from Cython.Build import cythonize
+
+setup(
+    name="nft-filter",
+    ext_modules=cythonize("nft_filter.pyx"),
+)